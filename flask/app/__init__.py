@@ -1,6 +1,14 @@
+import functools
 from flask import Flask
 import redis
 from ddtrace import tracer
+from .services.config_cache import ConfigCache
+from .services.history_serializer import HistorySerializer
+from .services.llm_service import LLMService
+from .services.ollama_recorder import OllamaRecorder
+from .services.semantic_cache import SemanticCache, stub_embedding
+from .profiler import profiler
+from .drain import drain
 
 
 @tracer.wrap()
@@ -17,9 +25,38 @@ def init_app():
         host=app.config["REDIS_HOST"],
         decode_responses=True
     )
+    # Binary client sharing the same server, for serialized history blobs
+    app.redis_binary_client = redis.Redis(
+        host=app.config["REDIS_HOST"],
+        decode_responses=False
+    )
+    app.history_serializer = HistorySerializer.from_config(app.config)
+    LLMService.recorder = OllamaRecorder.from_config(app.config)
+    app.config_cache = ConfigCache(app.redis_client, max_entries=app.config["CONFIG_CACHE_MAX_ENTRIES"])
+    
+    # Initialize semantic response cache (opt-in)
+    app.semantic_cache = None
+    if app.config["SEMANTIC_CACHE_ENABLED"]:
+        embed_model = app.config["SEMANTIC_CACHE_EMBED_MODEL"]
+        app.semantic_cache = SemanticCache(
+            embed=stub_embedding if embed_model == "stub" else functools.partial(LLMService.embed, embed_model),
+            threshold=app.config["SEMANTIC_CACHE_THRESHOLD"],
+            max_entries=app.config["SEMANTIC_CACHE_MAX_ENTRIES"],
+            ttl=app.config["SEMANTIC_CACHE_TTL"]
+        )
+    
+    # Hook the sampling profiler into the request lifecycle
+    profiler.init_app(app)
+    
+    # Read the drain settings (drain is hooked to SIGTERM in gunicorn.conf.py)
+    drain.init_app(app)
     
     # Import routes within app context
     with app.app_context():
         from . import routes
     
+    # Register maintenance CLI commands (e.g. `flask chat report`)
+    from .cli import chat_cli
+    app.cli.add_command(chat_cli)
+    
     return app
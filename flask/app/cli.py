@@ -0,0 +1,206 @@
+import json
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+import click
+import requests
+from flask import current_app as app
+from flask.cli import AppGroup
+from app.services.retention_service import RetentionService
+from app.services.history_serializer import HistorySerializer
+from app.services.llm_service import LLMService
+
+chat_cli = AppGroup("chat", help="Maintenance commands for per-user chat state.")
+
+
+@chat_cli.command("report")
+@click.option("--top", default=10, show_default=True, help="Number of largest conversations to list.")
+def report(top):
+    """Report keys, bytes and the largest conversations stored in Redis."""
+    stats = RetentionService.report(top=top)
+
+    click.echo(f"Total: {stats['keys']} keys, {stats['bytes']} bytes ({stats['persistent']} without TTL)")
+    for prefix, prefix_stats in stats["by_prefix"].items():
+        click.echo(f"  {prefix}*: {prefix_stats['keys']} keys, {prefix_stats['bytes']} bytes")
+
+    if stats["largest"]:
+        click.echo("Largest conversations:")
+        for key, size, ttl in stats["largest"]:
+            click.echo(f"  {key}: {size} bytes, ttl={ttl}s")
+
+
+@chat_cli.command("sweep")
+@click.option("--dry-run", is_flag=True, help="Only count what would change.")
+def sweep(dry_run):
+    """Apply TTLs to chat keys without expiry and delete orphaned histories."""
+    stats = RetentionService.sweep(dry_run=dry_run)
+    click.echo(f"Scanned {stats['scanned']} keys: "
+               f"{stats['expired']} given a TTL, {stats['deleted']} orphaned histories deleted"
+               f"{' (dry run)' if dry_run else ''}")
+
+
+@chat_cli.command("bench-serializer")
+@click.option("--messages", default=40, show_default=True, help="Messages in the synthetic conversation.")
+@click.option("--words", default=300, show_default=True, help="Words per assistant answer.")
+@click.option("--iterations", default=200, show_default=True, help="Save/load rounds per format.")
+def bench_serializer(messages, words, iterations):
+    """Compare bytes stored and save/load time of history formats against legacy JSON."""
+    rng = random.Random(0)
+    vocabulary = ("the model answer idiom expression french english cat bag out let "
+                  "raining cats dogs break leg piece cake under weather bite bullet").split()
+    history = [
+        {
+            "role": "user" if i % 2 == 0 else "assistant",
+            "content": " ".join(rng.choice(vocabulary) for _ in range(20 if i % 2 == 0 else words))
+        }
+        for i in range(messages)
+    ]
+
+    def measure(dumps, loads):
+        blob = dumps(history)
+        start = time.perf_counter()
+        for _ in range(iterations):
+            dumps(history)
+        save = (time.perf_counter() - start) / iterations
+        start = time.perf_counter()
+        for _ in range(iterations):
+            loads(blob)
+        load = (time.perf_counter() - start) / iterations
+        return len(blob), save, load
+
+    results = [("legacy json", *measure(lambda h: json.dumps(h).encode("utf-8"), json.loads))]
+    for encoding in HistorySerializer.ENCODINGS:
+        for compression in HistorySerializer.COMPRESSIONS:
+            try:
+                serializer = HistorySerializer(encoding=encoding, compression=compression, threshold=0)
+            except ValueError:
+                continue  # compression not available in this environment
+            results.append((f"{encoding}+{compression}", *measure(serializer.dumps, serializer.loads)))
+
+    baseline = results[0][1]
+    click.echo(f"{'format':<16} {'bytes':>9} {'ratio':>6} {'save (us)':>10} {'load (us)':>10}")
+    for name, size, save, load in results:
+        click.echo(f"{name:<16} {size:>9} {size / baseline:>6.2f} {save * 1e6:>10.1f} {load * 1e6:>10.1f}")
+
+
+@chat_cli.command("stress")
+@click.option("--url", default="http://localhost:8001", show_default=True, help="Base URL of a running app.")
+@click.option("--user-id", default="stress-test", show_default=True, help="User ID every turn is posted as.")
+@click.option("--model", required=True, help="Model to configure for the user.")
+@click.option("--turns", default=20, show_default=True, help="Number of chat turns to post.")
+@click.option("--concurrency", default=8, show_default=True, help="Turns posted in parallel.")
+def stress(url, user_id, model, turns, concurrency):
+    """Post concurrent /ui/chat turns for one user and check that no message is lost.
+
+    Needs a running app with Ollama. Keep 2 x turns below CHAT_MAX_MESSAGES.
+    """
+    params = {"user_id": user_id}
+    requests.post(f"{url}/ui/config", params=params, json={"model": model, "prompt": "Answer in one word."}).raise_for_status()
+    requests.delete(f"{url}/ui/chat", params=params).raise_for_status()
+
+    def post_turn(turn):
+        start = time.perf_counter()
+        response = requests.post(f"{url}/ui/chat", params=params, json={"prompt": f"Say the number {turn}."}, stream=True)
+        # Read the whole stream, the answer is persisted once it completes
+        body = b"".join(response.iter_content(chunk_size=None))
+        return response.status_code, b'"error"' in body, time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        results = list(executor.map(post_turn, range(turns)))
+
+    history = requests.get(f"{url}/ui/chat", params=params).json()["history"]
+    failed = sum(1 for status, error, _ in results if status != 200 or error)
+    latencies = sorted(elapsed for _, _, elapsed in results)
+    click.echo(f"{turns} turns, {concurrency} in parallel: {failed} failed, "
+               f"p50={latencies[len(latencies) // 2]:.2f}s max={latencies[-1]:.2f}s")
+    if failed:
+        raise click.ClickException(f"{failed} turns failed, history can't be checked")
+
+    user_messages = [m["content"] for m in history if m["role"] == "user"]
+    missing = [turn for turn in range(turns) if f"Say the number {turn}." not in user_messages]
+    click.echo(f"History: {len(history)} messages, expected {2 * turns}")
+    if missing or len(history) != 2 * turns:
+        raise click.ClickException(f"Lost messages, missing user turns: {missing}")
+    click.echo("No message lost")
+
+
+def _percentile(values, percentile):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percentile))]
+
+
+@chat_cli.command("bench-replay")
+@click.option("--rounds", default=3, show_default=True, help="Times each recording is replayed.")
+@click.option("--output", type=click.Path(dir_okay=False), help="Write the results to this JSON file.")
+@click.option("--baseline", type=click.Path(exists=True, dir_okay=False), help="Fail on regressions against these results.")
+@click.option("--tolerance", default=0.10, show_default=True, help="Allowed relative regression against the baseline.")
+def bench_replay(rounds, output, baseline, tolerance):
+    """Benchmark /ui/chat end to end on replayed Ollama recordings (run with OLLAMA_MODE=replay).
+
+    Every single-turn recording is replayed through the full stack (SSE streaming,
+    persistence, telemetry), as a fresh user configured with the recorded model and prompt.
+    """
+    recorder = LLMService.recorder
+    if not recorder or recorder.mode != "replay":
+        raise click.ClickException("Run with OLLAMA_MODE=replay")
+
+    scenarios = []
+    for path in recorder.recordings():
+        request = recorder.read_request(path)
+        messages = request["messages"]
+        prompt = messages[0]["content"] if messages and messages[0]["role"] == "system" else ""
+        turns = [m for m in messages if m["role"] != "system"]
+        if len(turns) == 1 and turns[0]["role"] == "user":
+            scenarios.append((request["model"], prompt, turns[0]["content"]))
+    if not scenarios:
+        raise click.ClickException(f"No single-turn recordings in {recorder.directory}")
+
+    client = app.test_client()
+    ttfb, total, chunks = [], [], 0
+    for round_index in range(rounds):
+        for index, (model, prompt, message) in enumerate(scenarios):
+            params = {"user_id": f"bench-replay-{index}"}
+            client.post("/ui/config", query_string=params, json={"model": model, "prompt": prompt})
+            client.delete("/ui/chat", query_string=params)
+
+            start = time.perf_counter()
+            response = client.post("/ui/chat", query_string=params, json={"prompt": message}, buffered=False)
+            first = None
+            for data in response.response:
+                if first is None:
+                    first = time.perf_counter() - start
+                chunks += data.count(b"data: ")
+            response.close()
+            ttfb.append(first or 0)
+            total.append(time.perf_counter() - start)
+
+    elapsed = sum(total)
+    results = {
+        "requests": len(total),
+        "ttfb_p50": _percentile(ttfb, 0.50),
+        "ttfb_p95": _percentile(ttfb, 0.95),
+        "latency_p50": _percentile(total, 0.50),
+        "latency_p95": _percentile(total, 0.95),
+        "events_per_second": chunks / elapsed if elapsed else 0,
+    }
+    for name, value in results.items():
+        click.echo(f"{name:<18} {value:.6f}" if isinstance(value, float) else f"{name:<18} {value}")
+
+    if output:
+        with open(output, "w") as f:
+            json.dump(results, f, indent=2)
+
+    if baseline:
+        with open(baseline) as f:
+            reference = json.load(f)
+        regressions = []
+        for name, value in results.items():
+            if name == "requests" or not reference.get(name):
+                continue
+            change = (value - reference[name]) / reference[name]
+            # Latencies regress when they grow, throughput when it shrinks
+            if (change > tolerance) if name != "events_per_second" else (change < -tolerance):
+                regressions.append(f"{name} {reference[name]:.6f} -> {value:.6f} ({change:+.1%})")
+        if regressions:
+            raise click.ClickException("Performance regression:\n  " + "\n  ".join(regressions))
+        click.echo(f"No regression beyond {tolerance:.0%} against {baseline}")
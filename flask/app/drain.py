@@ -0,0 +1,97 @@
+import threading
+import time
+from app.logs import log
+from app.services.llm_service import abort_stream
+
+
+class DrainManager:
+    """Graceful drain of in-flight chat streams when a worker is asked to stop.
+
+    On SIGTERM (see gunicorn.conf.py) gunicorn stops accepting requests on the worker,
+    new chat streams land on the other workers or the next container. Then:
+    - active streams may finish within DRAIN_GRACE_SECONDS
+    - streams still running at the deadline are cut: a watcher thread aborts their Ollama
+      response, even one stalled on a read, their partial answer is persisted (checkpoint)
+      and the client is told the answer was interrupted
+    """
+
+    def __init__(self):
+        self.grace = 25
+        self.draining = False
+        self._begun = threading.Event()
+        self._expired = False
+        self._lock = threading.Lock()
+        self._streams = {}  # cut event -> streaming Ollama response
+        self.stats = {"drained": 0, "cut": 0}
+
+    def init_app(self, app):
+        """Read the DRAIN_* settings."""
+        self.grace = app.config["DRAIN_GRACE_SECONDS"]
+
+    def watch(self):
+        """Start the thread cutting remaining streams once the grace budget is spent. Call once per worker process."""
+        threading.Thread(target=self._cut_at_deadline, name="drain-watcher", daemon=True).start()
+
+    def begin(self):
+        """Start draining. Called from a signal handler, so it only flags the watcher thread."""
+        if self.draining:
+            return
+        self.draining = True
+        self._begun.set()
+
+    def _cut_at_deadline(self):
+        self._begun.wait()
+        time.sleep(self.grace)
+        self.cut_active()
+
+    def cut_active(self):
+        """Cut every active stream now."""
+        with self._lock:
+            self._expired = True
+            streams = list(self._streams.items())
+        for cut, response in streams:
+            cut.set()
+            abort_stream(response)
+
+    def stream_started(self, response):
+        """Track a stream, so it can be cut at the drain deadline.
+
+        Args:
+            response: Streaming Ollama response the stream reads from
+
+        Returns:
+            threading.Event: Set once the stream is cut, pass it back to stream_finished()
+        """
+        cut = threading.Event()
+        with self._lock:
+            self._streams[cut] = response
+            expired = self._expired
+        if expired:
+            cut.set()
+            abort_stream(response)
+        return cut
+
+    def stream_finished(self, cut):
+        """Record the end of a stream, counted as drained if it completed while draining."""
+        with self._lock:
+            self._streams.pop(cut, None)
+            if cut.is_set():
+                self.stats["cut"] += 1
+            elif self.draining:
+                self.stats["drained"] += 1
+
+    def report(self):
+        """Log how the drain went.
+
+        Returns:
+            dict: Streams drained (completed while draining), cut (checkpointed at the deadline)
+                and still active when the worker exits
+        """
+        with self._lock:
+            report = dict(self.stats, active=len(self._streams))
+        if self.draining:
+            log.info("Drain finished: %(drained)d streams drained, %(cut)d cut, %(active)d still active", report)
+        return report
+
+
+drain = DrainManager()
@@ -1,9 +1,103 @@
+import atexit
+import json
 import logging
+import logging.handlers
+import os
+import queue
+import random
+import flask
 
 FORMAT = ('%(asctime)s %(levelname)s [%(name)s] [%(filename)s:%(lineno)d] '
           '[dd.service=%(dd.service)s dd.env=%(dd.env)s dd.version=%(dd.version)s dd.trace_id=%(dd.trace_id)s dd.span_id=%(dd.span_id)s] '
           '- %(message)s')
 
-logging.basicConfig(format=FORMAT)
+# Logging mode: "text" (synchronous, FORMAT above) or "async-json" (queued, one JSON object per line)
+LOG_MODE = os.environ.get("LOG_MODE", "text").lower()
+# Longest message emitted in async-json mode, longer ones are truncated
+LOG_MAX_LENGTH = int(os.environ.get("LOG_MAX_LENGTH", 1000))
+# Per-route sampling of INFO lines in async-json mode, e.g. "/ui/chat=0.1,/ui/config=0.5"
+LOG_SAMPLE_RATES = os.environ.get("LOG_SAMPLE_RATES", "")
+
+DD_FIELDS = ("service", "env", "version", "trace_id", "span_id")
+
+
+class JSONFormatter(logging.Formatter):
+    """Format records as single-line JSON, with ddtrace fields and truncated messages."""
+
+    def __init__(self, max_length=LOG_MAX_LENGTH):
+        super().__init__()
+        self.max_length = max_length
+
+    def format(self, record):
+        message = record.getMessage()
+        if self.max_length and len(message) > self.max_length:
+            message = f"{message[:self.max_length]}... [truncated {len(message) - self.max_length} chars]"
+
+        entry = {
+            "timestamp": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "file": f"{record.filename}:{record.lineno}",
+            "message": message,
+            "dd": {field: getattr(record, f"dd.{field}", None) for field in DD_FIELDS}
+        }
+        if record.exc_info:
+            entry["error"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class RouteSamplingFilter(logging.Filter):
+    """Keep only a fraction of INFO lines emitted while serving the configured routes."""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates
+
+    @classmethod
+    def from_string(cls, value):
+        """Parse "route=rate,route=rate" into a filter."""
+        rates = {}
+        for item in filter(None, (part.strip() for part in value.split(","))):
+            route, _, rate = item.partition("=")
+            rates[route.strip()] = float(rate)
+        return cls(rates)
+
+    def filter(self, record):
+        if record.levelno != logging.INFO or not self.rates or not flask.has_request_context():
+            return True
+        request = flask.request
+        route = request.url_rule.rule if request.url_rule else request.path
+        rate = self.rates.get(route)
+        return rate is None or random.random() < rate
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that defers all formatting to the background writer thread."""
+
+    def prepare(self, record):
+        # The stock handler formats the message here, on the caller's thread
+        return record
+
+
+def _start_listener():
+    """Start a background writer draining the log queue to stderr."""
+    stream_handler = logging.StreamHandler()
+    stream_handler.setFormatter(JSONFormatter())
+    queue_handler.queue = queue.SimpleQueue()
+    listener = logging.handlers.QueueListener(queue_handler.queue, stream_handler, respect_handler_level=True)
+    listener.start()
+    atexit.register(listener.stop)
+
+
+if LOG_MODE == "async-json":
+    queue_handler = LazyQueueHandler(queue.SimpleQueue())
+    queue_handler.addFilter(RouteSamplingFilter.from_string(LOG_SAMPLE_RATES))
+    logging.basicConfig(handlers=[queue_handler])
+    _start_listener()
+    # Writer threads don't survive fork (e.g. gunicorn --preload), start a fresh one in children
+    os.register_at_fork(after_in_child=_start_listener)
+else:
+    logging.basicConfig(format=FORMAT)
+
 log = logging.getLogger(__name__)
 log.level = logging.INFO
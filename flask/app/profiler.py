@@ -0,0 +1,260 @@
+import collections
+import hmac
+import os
+import random
+import sys
+import threading
+import time
+import flask
+from ddtrace import tracer
+from app.logs import log
+from app.services.user_service import User
+
+
+class SamplingProfiler:
+    """Low-overhead, per-request sampling profiler.
+
+    A single background thread periodically snapshots the stacks of the threads serving
+    profiled requests, and aggregates them per route as collapsed stacks
+    ("route;frame;frame count"), the input format of flamegraph.pl and speedscope.
+
+    Settings (sample rate, user ID) live in Redis so that every worker picks them up,
+    samples are dumped per worker process in PROFILER_DIR by the sampler thread, never on
+    the profiled requests themselves.
+    """
+
+    SETTINGS_KEY = "profiler:settings"
+    TOKEN_HEADER = "X-Profiler-Token"
+    PROFILE_HEADER = "X-Profile"
+
+    def __init__(self):
+        self.redis_client = None
+        self.token = None
+        self.directory = None
+        self.interval = 0.005
+        self.refresh = 5
+        self.dump_interval = 10
+        self._lock = threading.Lock()
+        self._dump_lock = threading.Lock()
+        self._dirty = False  # samples taken since the last dump
+        self._dumped_at = 0
+        self._sessions = {}  # thread id -> route
+        self._stacks = collections.Counter()  # collapsed stack -> samples
+        self._wakeup = threading.Event()
+        self._thread = None
+        self._settings = {}
+        self._settings_loaded_at = 0
+
+    def init_app(self, app):
+        """Read the PROFILER_* settings and register the request hooks that start and stop sessions.
+
+        Settings are copied out of the app because sampling and dumping run outside of any app context.
+        """
+        self.redis_client = app.redis_client
+        self.token = app.config["PROFILER_TOKEN"]
+        self.directory = app.config["PROFILER_DIR"]
+        self.interval = app.config["PROFILER_INTERVAL_MS"] / 1000
+        self.refresh = app.config["PROFILER_REFRESH"]
+        self.dump_interval = app.config["PROFILER_DUMP_INTERVAL"]
+
+        @app.before_request
+        def start_profiling():
+            if flask.request.url_rule is None or not self.should_profile(flask.request, User.requested_id()):
+                return
+            self.start(flask.request.url_rule.rule)
+            flask.g.profiling = True
+
+        @app.after_request
+        def stop_profiling(response):
+            if flask.g.pop("profiling", False):
+                # Stop once the body is fully sent, so SSE streams are profiled too
+                response.call_on_close(self.stop)
+            return response
+
+    # Settings #############
+
+    def settings(self):
+        """Get the current profiling settings, refreshed from Redis at most every PROFILER_REFRESH seconds.
+
+        Returns:
+            dict: {"rate": float, "user_id": str}
+        """
+        if time.monotonic() - self._settings_loaded_at > self.refresh:
+            stored = self.redis_client.hgetall(self.SETTINGS_KEY)
+            self._settings = {
+                "rate": float(stored.get("rate", 0)),
+                "user_id": stored.get("user_id", "")
+            }
+            self._settings_loaded_at = time.monotonic()
+        return self._settings
+
+    def configure(self, rate=None, user_id=None):
+        """Store new profiling settings for all workers. Only updates provided values.
+
+        Args:
+            rate: Fraction of requests to profile, between 0 and 1
+            user_id: Profile every request from this user ID ("" to disable)
+
+        Returns:
+            dict: Updated settings
+
+        Raises:
+            ValueError: If rate is out of range
+        """
+        mapping = {}
+        if rate is not None:
+            rate = float(rate)
+            if not 0 <= rate <= 1:
+                raise ValueError("rate must be between 0 and 1")
+            mapping["rate"] = rate
+        if user_id is not None:
+            mapping["user_id"] = user_id.strip()
+        if mapping:
+            self.redis_client.hset(self.SETTINGS_KEY, mapping=mapping)
+        self._settings_loaded_at = 0
+        return self.settings()
+
+    def is_authorized(self, request):
+        """Check the request carries the profiler token. Profiling is disabled without a configured token."""
+        if not self.token:
+            return False
+        return hmac.compare_digest(request.headers.get(self.TOKEN_HEADER, "").encode(), self.token.encode())
+
+    def should_profile(self, request, user_id=None):
+        """Decide whether to profile the current request.
+
+        Args:
+            request: Current Flask request
+            user_id: Authenticated user ID, if any
+        """
+        if not self.token:
+            return False
+        if request.headers.get(self.PROFILE_HEADER) and self.is_authorized(request):
+            return True
+        settings = self.settings()
+        if settings["user_id"] and user_id == settings["user_id"]:
+            return True
+        return random.random() < settings["rate"]
+
+    # Sampling #############
+
+    def start(self, route):
+        """Start sampling the calling thread, attributing its stacks to route."""
+        with self._lock:
+            self._sessions[threading.get_ident()] = route
+            if self._thread is None or not self._thread.is_alive():
+                # Started lazily so that each (forked) worker gets its own thread
+                self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+                self._thread.start()
+        self._wakeup.set()
+
+        span = tracer.current_root_span()
+        if span:
+            span.set_tag("profiler.sampled", True)
+
+    def stop(self):
+        """Stop sampling the calling thread. Its samples are dumped by the sampler thread."""
+        with self._lock:
+            self._sessions.pop(threading.get_ident(), None)
+
+    def _run(self):
+        """Sampler loop, dumps pending samples and sleeps until there is at least one active session.
+
+        While sessions are active, samples are also dumped every PROFILER_DUMP_INTERVAL seconds.
+        """
+        while True:
+            if not self._sessions:
+                self._dump_pending()
+                self._wakeup.clear()
+                # Checked again after clearing, a session may have started in between
+                if not self._sessions:
+                    self._wakeup.wait()
+            time.sleep(self.interval)
+            self._sample()
+            if time.monotonic() - self._dumped_at >= self.dump_interval:
+                self._dump_pending()
+
+    def _sample(self):
+        frames = sys._current_frames()
+        with self._lock:
+            for thread_id, route in self._sessions.items():
+                frame = frames.get(thread_id)
+                if frame is not None:
+                    self._stacks[self._collapse(route, frame)] += 1
+                    self._dirty = True
+
+    def _dump_pending(self):
+        """Dump this worker's samples if any were taken since the last dump."""
+        if not self._dirty:
+            return
+        try:
+            self.dump()
+        except OSError as e:
+            log.error(f"Error dumping profiler samples: {str(e)}")
+
+    @staticmethod
+    def _collapse(route, frame):
+        """Render a frame's stack as "route;outermost;...;innermost"."""
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+            frame = frame.f_back
+        names.append(route)
+        return ";".join(reversed(names))
+
+    # Output #############
+
+    def dump(self):
+        """Write this worker's aggregated samples to PROFILER_DIR/<pid>.folded."""
+        with self._dump_lock:
+            with self._lock:
+                lines = [f"{stack} {count}\n" for stack, count in self._stacks.items()]
+                self._dirty = False
+            self._dumped_at = time.monotonic()
+            if not lines:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f"{os.getpid()}.folded")
+            with open(f"{path}.tmp", "w") as f:
+                f.writelines(lines)
+            os.replace(f"{path}.tmp", path)
+
+    def collapsed(self, route=None):
+        """Merge the samples dumped by all workers, including this worker's latest samples.
+
+        Args:
+            route: Only keep stacks for this route
+
+        Returns:
+            collections.Counter: collapsed stack -> samples
+        """
+        self._dump_pending()
+        merged = collections.Counter()
+        directory = self.directory
+        if not os.path.isdir(directory):
+            return merged
+        for name in os.listdir(directory):
+            if not name.endswith(".folded"):
+                continue
+            with open(os.path.join(directory, name)) as f:
+                for line in f:
+                    stack, _, count = line.rstrip("\n").rpartition(" ")
+                    if route is None or stack.split(";", 1)[0] == route:
+                        merged[stack] += int(count)
+        return merged
+
+    def reset(self):
+        """Discard this worker's samples and every worker's dumps."""
+        with self._lock:
+            self._stacks.clear()
+            self._dirty = False
+        directory = self.directory
+        if os.path.isdir(directory):
+            for name in os.listdir(directory):
+                if name.endswith(".folded"):
+                    os.remove(os.path.join(directory, name))
+
+
+profiler = SamplingProfiler()
+
@@ -7,6 +7,7 @@ from app.services.llm_service import LLMService
 from . import auth
 from . import chat
 from . import config
+from . import profiler
 
 @app.route("/")
 def home():
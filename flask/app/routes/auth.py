@@ -1,4 +1,3 @@
-import flask
 from app.services.user_service import User
 from app.logs import log
 
@@ -14,17 +13,9 @@ def auth():
         User: Authenticated user instance
     """
 
-    # Login when user_id is injected as a URL param 
-    if flask.request.args.get("user_id"):
-        user = User(flask.request.args.get("user_id"))
-
-    # Login as random user (when session cookie is empty)
-    elif not flask.session.get("user_id"):
-        user = User()
-
-    # Recognizes an existing user (through session cookie)
-    else:
-        user = User.from_session()
+    # Login as the URL param user, else the session cookie user (see User.requested_id),
+    # else as a random user (when session cookie is empty)
+    user = User(User.requested_id())
 
     user.login()
     return user 
\ No newline at end of file
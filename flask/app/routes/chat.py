@@ -2,6 +2,7 @@ import json
 import flask
 from flask import current_app as app, request
 from app.logs import log
+from app.drain import drain
 from app.services.chat_service import StatefulChatService, StatelessChatService
 from .auth import auth
 
@@ -11,7 +12,8 @@ def create_sse_response(response, cleanup_callback=None):
     
     Args:
         response: requests.Response object from Ollama
-        cleanup_callback: Optional callback function to execute after streaming completes
+        cleanup_callback: Optional callback function to execute after streaming completes,
+            called with the collected response and complete=False if the stream was cut
         
     Returns:
         Flask Response object configured for SSE
@@ -21,25 +23,36 @@ def create_sse_response(response, cleanup_callback=None):
     collected_chunks = []
     
     def stream_response():
+        cut = drain.stream_started(response)
         try:
-            for line in response.iter_lines():
-                if line:
-                    try:
-                        chunk = json.loads(line)
-                        if chunk.get("message", {}).get("content"):
-                            content = chunk["message"]["content"]
-                            collected_chunks.append(content)
-                            yield f"data: {json.dumps({'content': content})}\n\n"
-                    except json.JSONDecodeError:
-                        log.warning(f"Failed to parse chunk: {line}")
-                        continue
+            try:
+                for line in response.iter_lines():
+                    if line:
+                        try:
+                            chunk = json.loads(line)
+                            if chunk.get("message", {}).get("content"):
+                                content = chunk["message"]["content"]
+                                collected_chunks.append(content)
+                                yield f"data: {json.dumps({'content': content})}\n\n"
+                        except json.JSONDecodeError:
+                            log.warning("Failed to parse chunk: %r", line)
+                            continue
+            except Exception:
+                # Reads fail once the drain deadline aborts the stream, that's a cut, not an error
+                if not cut.is_set():
+                    raise
             
             # After all chunks collected, execute cleanup callback if provided
             if cleanup_callback and collected_chunks:
                 # Use the app context for the cleanup operation
                 with ctx:
                     complete_response = "".join(collected_chunks).strip()
-                    cleanup_callback(complete_response)
+                    cleanup_callback(complete_response, complete=not cut.is_set())
+            
+            if cut.is_set():
+                # Worker is stopping and the grace budget is spent: the partial answer was checkpointed
+                log.warning("Stream cut by worker shutdown after %d chunks, partial answer persisted", len(collected_chunks))
+                yield f"data: {json.dumps({'interrupted': True})}\n\n"
             
             yield "data: [DONE]\n\n"
             
@@ -47,8 +60,11 @@ def create_sse_response(response, cleanup_callback=None):
             log.error(f"Error during streaming: {str(e)}")
             yield f"data: {json.dumps({'error': str(e)})}\n\n"
             yield "data: [DONE]\n\n"
+        finally:
+            drain.stream_finished(cut)
     
-    return flask.Response(stream_response(), mimetype='text/event-stream')
+    # Keep the request context while streaming, so logs (route sampling) still see the request
+    return flask.Response(flask.stream_with_context(stream_response()), mimetype='text/event-stream')
 
 
 @app.route("/ui/chat/init", methods=['GET'])
@@ -122,7 +138,17 @@ def api_chat():
     {
         "message": "The user message to respond to",
         "prompt": "(optional) System prompt to control model behavior",
-        "model": "The model to use (e.g. 'mistral:latest', 'llama2:latest', etc.)"
+        "model": "The model to use (e.g. 'mistral:latest', 'llama2:latest', etc.)",
+        "max_tokens": "(optional) Stop after this many tokens and return a truncated response",
+        "max_latency": "(optional) Stop after this many seconds and return a truncated response"
+    }
+    
+    Response body:
+    {
+        "response": "The model's answer (partial if truncated)",
+        "truncated": false,
+        "usage": {"eval_count": ..., "total_duration": ..., ...},
+        "cached": false
     }
     """
     try:
@@ -137,6 +163,14 @@ def api_chat():
         if 'message' not in request_data:
             return flask.jsonify({"error": "Missing message in request"}), 400
 
+        try:
+            max_tokens = int(request_data['max_tokens']) if request_data.get('max_tokens') is not None else None
+            max_latency = float(request_data['max_latency']) if request_data.get('max_latency') is not None else None
+        except (TypeError, ValueError):
+            return flask.jsonify({"error": "max_tokens and max_latency must be numbers"}), 400
+        if (max_tokens is not None and max_tokens <= 0) or (max_latency is not None and max_latency <= 0):
+            return flask.jsonify({"error": "max_tokens and max_latency must be positive"}), 400
+
         # Initialize chat service with model and prompt
         chat_service = StatelessChatService(
             model=request_data['model'],
@@ -145,8 +179,13 @@ def api_chat():
         
         # Process the message
         messages = [{"role": "user", "content": request_data["message"]}]
-        response = chat_service.process_message(messages)
-        return flask.jsonify({"response": response})
+        result = chat_service.process_message(messages, max_tokens=max_tokens, max_latency=max_latency)
+        return flask.jsonify({
+            "response": result["content"],
+            "truncated": result["truncated"],
+            "usage": result["usage"],
+            "cached": result["cached"]
+        })
             
     except ValueError as e:
         # Handle Ollama status errors
@@ -1,3 +1,4 @@
+import os
 import flask
 from flask import current_app as app
 from app.logs import log
@@ -16,6 +17,21 @@ def _create_config_response(model=None, prompt=None, status="success"):
     })
 
 
+# Default prompt cached per worker, re-read only when the file changes
+_default_prompt_cache = {"mtime": None, "prompt": None}
+
+
+def _load_default_prompt():
+    """Load the default prompt, from cache unless the file was modified since last read."""
+    path = app.config["DEFAULT_PROMPT_PATH"]
+    mtime = os.stat(path).st_mtime
+    if _default_prompt_cache["mtime"] != mtime:
+        with open(path, 'r') as f:
+            _default_prompt_cache["prompt"] = f.read().strip()
+        _default_prompt_cache["mtime"] = mtime
+    return _default_prompt_cache["prompt"]
+
+
 @app.route("/ui/config", methods=['GET', 'POST'])
 def config():
     """Endpoint for managing chat configuration (model and prompt)."""
@@ -91,11 +107,9 @@ def models():
 def default_prompt():
     """Endpoint for getting the default prompt."""
     try:
-        with open('/flask/default_prompt.txt', 'r') as f:
-            default_prompt = f.read().strip()
         return flask.jsonify({
             "status": "success",
-            "prompt": default_prompt
+            "prompt": _load_default_prompt()
         }), 200
     except Exception as e:
         log.error(f"Error getting default prompt: {str(e)}")
@@ -0,0 +1,71 @@
+import flask
+from app.logs import log
+from app.profiler import profiler as sampling_profiler
+from flask import current_app as app
+
+
+@app.route("/api/profiler", methods=['GET', 'POST', 'DELETE'])
+def profiler():
+    """Endpoint for managing the sampling profiler. Requires the X-Profiler-Token header.
+
+    POST body (all optional):
+    {
+        "rate": "Fraction of requests to profile, between 0 and 1",
+        "user_id": "Profile every request from this user ID (empty string to disable)"
+    }
+    """
+    if not sampling_profiler.is_authorized(flask.request):
+        return flask.jsonify({"error": "Not found"}), 404
+
+    try:
+        if flask.request.method == 'GET':
+            samples = sampling_profiler.collapsed()
+            routes = {}
+            for stack, count in samples.items():
+                route = stack.split(";", 1)[0]
+                routes[route] = routes.get(route, 0) + count
+            return flask.jsonify({
+                "status": "success",
+                "settings": sampling_profiler.settings(),
+                "samples": routes
+            }), 200
+
+        if flask.request.method == 'DELETE':
+            # Disable profiling and discard samples
+            sampling_profiler.configure(rate=0, user_id="")
+            sampling_profiler.reset()
+            return flask.jsonify({"status": "success"}), 200
+
+        # Handle POST request
+        request_data = flask.request.get_json()
+        if not request_data:
+            return flask.jsonify({"error": "No data provided"}), 400
+
+        try:
+            settings = sampling_profiler.configure(
+                rate=request_data.get('rate'),
+                user_id=request_data.get('user_id')
+            )
+        except (TypeError, ValueError) as e:
+            return flask.jsonify({"error": str(e)}), 400
+
+        log.info("Profiler settings updated: %s", settings)
+        return flask.jsonify({"status": "success", "settings": settings}), 200
+
+    except Exception as e:
+        log.error(f"Error in profiler endpoint: {str(e)}")
+        return flask.jsonify({"error": str(e)}), 500
+
+
+@app.route("/api/profiler/stacks", methods=['GET'])
+def profiler_stacks():
+    """Collapsed stacks merged across workers, optionally for a single route (?route=/ui/chat).
+
+    The output can be rendered with flamegraph.pl or opened in speedscope.
+    """
+    if not sampling_profiler.is_authorized(flask.request):
+        return flask.jsonify({"error": "Not found"}), 404
+
+    samples = sampling_profiler.collapsed(route=flask.request.args.get("route"))
+    body = "".join(f"{stack} {count}\n" for stack, count in samples.most_common())
+    return flask.Response(body, mimetype="text/plain")
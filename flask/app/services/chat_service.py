@@ -1,6 +1,8 @@
-import json
+import itertools
+import redis
 from app.logs import log
-from .llm_service import LLMService
+from .llm_service import LLMService, CannedResponse
+from .semantic_cache import SemanticCache
 from ddtrace import tracer
 from flask import current_app as app
 from ddtrace.llmobs import LLMObs
@@ -25,11 +27,56 @@ class ChatService:
         # Initialize LLM service if model is provided
         self.llm_service = LLMService(model=model, prompt=prompt) if model else None
     
-    def process_message(self, messages):
-        """Process a message and return the response."""
+    def _cache_lookup(self, messages):
+        """Look up a single-turn conversation in the semantic cache.
+        
+        Leading assistant messages (the web app's welcome message) are ignored, so the
+        first user turn of a /ui/chat conversation counts as a single turn too.
+        
+        Args:
+            messages: List of message dictionaries with role and content
+            
+        Returns:
+            tuple: (cache entry, answer)
+                - cache entry: (namespace, vector) to store the answer under on a miss,
+                  None if the cache is disabled or doesn't apply
+                - answer: Cached answer on a hit, None otherwise
+        """
+        cache = app.semantic_cache
+        if not cache:
+            return None, None
+        turns = list(itertools.dropwhile(lambda message: message["role"] == "assistant", messages))
+        if len(turns) != 1 or turns[0]["role"] != "user":
+            return None, None
+        
+        namespace = SemanticCache.namespace(self.llm_service.model, self.llm_service.prompt)
+        vector = cache.embed(turns[0]["content"])
+        answer, _ = cache.lookup(namespace, vector)
+        return (namespace, vector), answer
+
+    def process_message(self, messages, max_tokens=None, max_latency=None):
+        """Process a message and return the response.
+        
+        Args:
+            messages: List of message dictionaries with role and content
+            max_tokens: Optional cap on generated tokens before truncating
+            max_latency: Optional wall-clock budget in seconds before truncating
+            
+        Returns:
+            dict: {"content": str, "truncated": bool, "usage": dict, "cached": bool}
+        """
         if not self.llm_service:
             raise RuntimeError("LLM service not initialized")
-        return self.llm_service.generate_response_sync(messages)
+        
+        cache_entry, answer = self._cache_lookup(messages)
+        if answer is not None:
+            return {"content": answer, "truncated": False, "usage": {}, "cached": True}
+        
+        result = self.llm_service.generate_response_sync(messages, max_tokens=max_tokens, max_latency=max_latency)
+        if cache_entry and not result["truncated"]:
+            app.semantic_cache.store(*cache_entry, result["content"])
+        result["cached"] = False
+        return result
     
     def process_message_stream(self, messages):
         """Process a message and return the streaming response.
@@ -54,6 +101,9 @@ class StatelessChatService(ChatService):
 class StatefulChatService(ChatService):
     """Service for handling chat requests with state persistence."""
     
+    # Optimistic write attempts before giving up on a contended history
+    MAX_WRITE_RETRIES = 10
+    
     @classmethod
     def exists(cls, user_id):
         """Check if a chat exists for the given user.
@@ -64,8 +114,7 @@ class StatefulChatService(ChatService):
         Returns:
             bool: True if chat exists, False otherwise
         """
-        config_key = f"chat_config:{user_id}"
-        return bool(app.redis_client.exists(config_key))
+        return app.config_cache.get(user_id) is not None
     
     @classmethod
     def create(cls, user, model, prompt):
@@ -94,7 +143,12 @@ class StatefulChatService(ChatService):
         instance.config = {'model': model, 'prompt': prompt}
         
         # Save initial config
-        app.redis_client.hset(instance.config_key, mapping=instance.config)
+        pipe = app.redis_client.pipeline()
+        pipe.hset(instance.config_key, mapping=instance.config)
+        instance._refresh_ttl(pipe)
+        pipe.execute()
+        # Other workers are invalidated by keyspace notifications, this one right away
+        app.config_cache.invalidate(user.user_id)
         
         # Initialize base class
         super(StatefulChatService, instance).__init__(
@@ -102,7 +156,7 @@ class StatefulChatService(ChatService):
             prompt=instance.config['prompt']
         )
         
-        log.info(f"Created new chat service for user {instance.user.user_id}")
+        log.info("Created new chat service for user %s", instance.user.user_id)
         return instance
     
     @tracer.wrap(name="chat.initialize")
@@ -113,40 +167,80 @@ class StatefulChatService(ChatService):
         self.history_key = f"chat_history:{user.user_id}"
         self.config_key = f"chat_config:{user.user_id}"
         
-        # Load history
-        history = app.redis_client.get(self.history_key)
-        self.history = json.loads(history) if history else []
-        
-        # Load config
-        config = app.redis_client.hgetall(self.config_key)
+        # Load config (cached per worker)
+        config = app.config_cache.get(user.user_id)
         if not config:
             log.error(f"No config set for user {self.user.user_id}")
             raise ValueError(f"No configuration set for user {self.user.user_id}. Please set model and prompt first.")
-            
-        self.config = {
-            'model': config.get('model', ''),
-            'prompt': config.get('prompt', '')
-        }
-        log.info(f"Loaded config from Redis for user {self.user.user_id}: model={self.config['model']}, prompt={self.config['prompt'][:50]}...")
+        self.config = config
+        
+        # Load history in the same round trip that slides the TTLs forward
+        pipe = app.redis_binary_client.pipeline()
+        pipe.get(self.history_key)
+        self._refresh_ttl(pipe)
+        self.history = app.history_serializer.loads(pipe.execute()[0])
+        
+        log.info("Loaded config for user %s: model=%s, prompt=%.50s...", self.user.user_id, self.config['model'], self.config['prompt'])
         
         # Initialize base class with loaded config
         super().__init__(model=self.config['model'], prompt=self.config['prompt'])
         
-        log.info(f"Initialized chat service for user {self.user.user_id}")
+        log.info("Initialized chat service for user %s", self.user.user_id)
+
+    def _refresh_ttl(self, pipe):
+        """Queue a sliding TTL refresh of the user's chat keys on a pipeline.
+        
+        Args:
+            pipe: Redis pipeline the EXPIRE commands are added to
+        """
+        ttl = app.config["CHAT_TTL"]
+        if ttl:
+            pipe.expire(self.history_key, ttl)
+            pipe.expire(self.config_key, ttl)
 
     @tracer.wrap(name="chat.clear_history")
     def clear_history(self):
         """Clear chat history."""
         app.redis_client.delete(self.history_key)
         self.history = []
-        log.info(f"Cleared history for user {self.user.user_id}")
+        log.info("Cleared history for user %s", self.user.user_id)
 
     @tracer.wrap(name="chat._add_message")
     def _add_message(self, content, role):
-        """Add a message to history and persist it."""
-        self.history.append({"role": role, "content": content})
-        app.redis_client.set(self.history_key, json.dumps(self.history))
-        log.info(f"Added {role} message for user {self.user.user_id}, total messages: {len(self.history)}")
+        """Append a message to the stored history, without losing concurrent appends.
+        
+        The history is re-read under WATCH and written back in a MULTI, retried whenever
+        another turn for the same user wrote in between (optimistic concurrency).
+        self.history is refreshed with the stored result, including concurrent messages.
+        
+        Raises:
+            RuntimeError: If the history kept changing for MAX_WRITE_RETRIES attempts
+        """
+        max_messages = app.config["CHAT_MAX_MESSAGES"]
+        
+        with app.redis_binary_client.pipeline() as pipe:
+            for attempt in range(self.MAX_WRITE_RETRIES):
+                try:
+                    pipe.watch(self.history_key)
+                    history = app.history_serializer.loads(pipe.get(self.history_key))
+                    history.append({"role": role, "content": content})
+                    
+                    # Cap the conversation size, dropping the oldest messages first
+                    if len(history) > max_messages:
+                        history = history[-max_messages:]
+                    
+                    pipe.multi()
+                    pipe.set(self.history_key, app.history_serializer.dumps(history))
+                    self._refresh_ttl(pipe)
+                    pipe.execute()
+                    break
+                except redis.WatchError:
+                    log.info("Concurrent history update for user %s, retrying (attempt %d)", self.user.user_id, attempt + 1)
+            else:
+                raise RuntimeError(f"Could not persist {role} message for user {self.user.user_id}: too many concurrent updates")
+        
+        self.history = history
+        log.info("Added %s message for user %s, total messages: %d", role, self.user.user_id, len(self.history))
 
     @tracer.wrap(name="chat.set_config")
     def set_config(self, model=None, prompt=None):
@@ -174,38 +268,55 @@ class StatefulChatService(ChatService):
             self.config['prompt'] = prompt
             
         # Update Redis
-        app.redis_client.hset(self.config_key, mapping=self.config)
+        pipe = app.redis_client.pipeline()
+        pipe.hset(self.config_key, mapping=self.config)
+        self._refresh_ttl(pipe)
+        pipe.execute()
+        app.config_cache.invalidate(self.user.user_id)
         
         # Reinitialize LLM service with new config
         self.llm_service = LLMService(model=self.config['model'], prompt=self.config['prompt'])
         
-        log.info(f"Updated config for user {self.user.user_id}")
+        log.info("Updated config for user %s", self.user.user_id)
         return self.config
 
-    def _create_cleanup_callback(self, input_messages):
+    def _create_cleanup_callback(self, input_messages, cache_entry=None, cached=False):
         """Create a cleanup callback for handling persistence and telemetry.
         
         Args:
             input_messages: The messages that were sent to the LLM
+            cache_entry: Optional (namespace, vector) to store the complete response under in the semantic cache
+            cached: True if the response was served from the semantic cache (no LLM call to report)
             
         Returns:
             callable: Cleanup callback function
         """
         
-        def cleanup_callback(complete_response):
-            """Handle persistence and telemetry after streaming completes."""
+        def cleanup_callback(complete_response, complete=True):
+            """Handle persistence and telemetry after streaming completes.
+            
+            Args:
+                complete_response: The collected response
+                complete: False if the stream was cut short (e.g. worker shutdown), the
+                    partial response is persisted but never cached
+            """
             try:
                 # Handle LLM observability telemetry
-                with LLMObs.llm(model_name=self.config['model'], model_provider="ollama") as span:
-                    LLMObs.annotate(
-                        span=span,
-                        input_data=input_messages,
-                        output_data={"role": "assistant", "content": complete_response}
-                    )
+                if not cached:
+                    with LLMObs.llm(model_name=self.config['model'], model_provider="ollama") as span:
+                        LLMObs.annotate(
+                            span=span,
+                            input_data=input_messages,
+                            output_data={"role": "assistant", "content": complete_response},
+                            metadata={"truncated": not complete}
+                        )
+                
+                if cache_entry and complete:
+                    app.semantic_cache.store(*cache_entry, complete_response)
                 
                 # Persist the assistant's response
                 self._add_message(complete_response, "assistant")
-                log.info(f"Persisted complete response ({len(complete_response)} chars)")
+                log.info("Persisted complete response (%d chars)", len(complete_response))
                 
             except Exception as e:
                 log.error(f"Error in cleanup callback: {str(e)}")
@@ -226,13 +337,20 @@ class StatefulChatService(ChatService):
         """
         # Add user's message to history
         self._add_message(message_content, "user")
-        log.info(f"Added user message to history: {message_content[:50]}...")
+        log.info("Added user message to history: %.50s...", message_content)
+        
+        # Serve first turns from the semantic cache when possible
+        cache_entry, answer = self._cache_lookup(self.history)
+        if answer is not None:
+            response = CannedResponse(self.config['model'], answer)
+            cleanup_callback = self._create_cleanup_callback(self.history, cached=True)
+            return response, cleanup_callback
         
         # Get streaming response from LLM using history
         response = super().process_message_stream(self.history)
         
         # Create cleanup callback
-        cleanup_callback = self._create_cleanup_callback(self.history)
+        cleanup_callback = self._create_cleanup_callback(self.history, cache_entry=cache_entry)
         
         return response, cleanup_callback
         
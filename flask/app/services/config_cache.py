@@ -0,0 +1,138 @@
+import collections
+import os
+import threading
+import redis
+from app.logs import log
+
+
+class ConfigCache:
+    """Per-worker read-through cache of user chat configs.
+
+    Entries are invalidated by Redis keyspace notifications on `chat_config:*` keys, so writes
+    from any worker (and expiry or deletion by retention) show up right away without polling.
+    While the notification listener is down, the cache is bypassed.
+    """
+
+    KEY_PREFIX = "chat_config:"
+    # Keyspace events the cache needs: K (keyspace channel), g (del, expired...), h (hash commands), x (expired)
+    REQUIRED_EVENTS = "Kghx"
+    # A TTL refresh doesn't change the config, it shouldn't evict it
+    IGNORED_EVENTS = ("expire",)
+
+    _MISSING = object()
+
+    def __init__(self, redis_client, max_entries=10000):
+        """Initialize the cache.
+
+        Args:
+            redis_client: Redis client (decode_responses=True) the configs are read from
+            max_entries: Maximum cached configs, least recently used are evicted first
+        """
+        self.redis_client = redis_client
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._entries = collections.OrderedDict()  # user_id -> config dict, or None if no config
+        self._generation = 0  # bumped on every invalidation, guards against caching reads raced by a write
+        self._listener = None
+        self._listener_pid = None
+        self.enabled = None  # checked on first use, so the app can start while Redis is unreachable
+
+    def _enable_notifications(self):
+        """Make sure Redis publishes the keyspace events the cache relies on.
+
+        Returns:
+            bool: False if notifications can't be enabled (e.g. CONFIG is disabled), the cache is then bypassed.
+                None if Redis is unreachable, to check again on next use.
+        """
+        try:
+            current = self.redis_client.config_get("notify-keyspace-events").get("notify-keyspace-events", "")
+            # "A" is an alias covering every event class (g, h, x...), but not the K channel type
+            covered = current + ("ghx" if "A" in current else "")
+            missing = "".join(flag for flag in self.REQUIRED_EVENTS if flag not in covered)
+            if missing:
+                self.redis_client.config_set("notify-keyspace-events", current + missing)
+            return True
+        except redis.exceptions.ConnectionError:
+            return None
+        except Exception as e:
+            log.warning(f"Config cache disabled, cannot enable Redis keyspace notifications: {str(e)}")
+            return False
+
+    def _ensure_listener(self):
+        """Start the notification listener in this process if it isn't running.
+
+        Returns:
+            bool: True if the listener is running and the cache can be used
+        """
+        if self.enabled is None:
+            self.enabled = self._enable_notifications()
+        if not self.enabled:
+            return False
+        if self._listener is not None and self._listener.is_alive() and self._listener_pid == os.getpid():
+            return True
+
+        # Anything cached while the listener was down (or inherited through fork) may be stale
+        self.clear()
+        try:
+            db = self.redis_client.connection_pool.connection_kwargs.get("db", 0)
+            pubsub = self.redis_client.pubsub(ignore_subscribe_messages=True)
+            pubsub.psubscribe(**{f"__keyspace@{db}__:{self.KEY_PREFIX}*": self._on_notification})
+            self._listener = pubsub.run_in_thread(sleep_time=1, daemon=True, exception_handler=self._on_listener_error)
+            self._listener_pid = os.getpid()
+            return True
+        except Exception as e:
+            log.warning(f"Config cache bypassed, cannot subscribe to keyspace notifications: {str(e)}")
+            return False
+
+    def _on_notification(self, message):
+        if message["data"] in self.IGNORED_EVENTS:
+            return
+        self.invalidate(message["channel"].split(self.KEY_PREFIX, 1)[1])
+
+    def _on_listener_error(self, error, pubsub, thread):
+        log.warning(f"Config cache listener stopped, cache bypassed until it restarts: {str(error)}")
+        thread.stop()
+        pubsub.close()
+        self.clear()
+
+    def get(self, user_id):
+        """Get a user's chat config.
+
+        Args:
+            user_id: User ID
+
+        Returns:
+            dict: {"model": str, "prompt": str}, or None if the user has no config
+        """
+        cacheable = self._ensure_listener()
+        if cacheable:
+            with self._lock:
+                config = self._entries.get(user_id, self._MISSING)
+                if config is not self._MISSING:
+                    self._entries.move_to_end(user_id)
+                    return dict(config) if config else None
+                generation = self._generation
+
+        stored = self.redis_client.hgetall(f"{self.KEY_PREFIX}{user_id}")
+        config = {'model': stored.get('model', ''), 'prompt': stored.get('prompt', '')} if stored else None
+
+        if cacheable:
+            with self._lock:
+                # Skip caching if anything was invalidated since the read, it may be stale already
+                if generation == self._generation:
+                    self._entries[user_id] = config
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+        return dict(config) if config else None
+
+    def invalidate(self, user_id):
+        """Drop a user's cached config."""
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def clear(self):
+        """Drop every cached config."""
+        with self._lock:
+            self._generation += 1
+            self._entries.clear()
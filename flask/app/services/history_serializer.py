@@ -0,0 +1,117 @@
+import json
+import zlib
+import msgpack
+
+try:
+    import zstandard
+except ImportError:  # optional, only needed to read/write zstd-compressed history
+    zstandard = None
+
+
+class HistorySerializer:
+    """Pluggable serializer for chat history stored in Redis.
+
+    Stored blobs are tagged with a 3-byte header so formats can coexist and be read transparently:
+        VERSION | encoding code | compression code | payload
+    Untagged blobs are legacy JSON text, as written before this serializer existed.
+    """
+
+    VERSION = b"\x01"
+
+    # name: (tag code, encode, decode)
+    ENCODINGS = {
+        "json": (b"j",
+                 lambda history: json.dumps(history, separators=(",", ":"), ensure_ascii=False).encode("utf-8"),
+                 lambda payload: json.loads(payload)),
+        "msgpack": (b"m",
+                    lambda history: msgpack.packb(history, use_bin_type=True),
+                    lambda payload: msgpack.unpackb(payload, raw=False)),
+    }
+
+    # name: (tag code, compress, decompress)
+    COMPRESSIONS = {
+        "none": (b"-", lambda data: data, lambda data: data),
+        "zlib": (b"z", lambda data: zlib.compress(data, 6), zlib.decompress),
+        "zstd": (b"s",
+                 lambda data: zstandard.ZstdCompressor(level=3).compress(data),
+                 lambda data: zstandard.ZstdDecompressor().decompress(data)),
+    }
+
+    def __init__(self, encoding="msgpack", compression="zlib", threshold=1024):
+        """Initialize the serializer.
+
+        Args:
+            encoding: Encoding used for writes ("json" or "msgpack")
+            compression: Compression used for writes above threshold ("none", "zlib" or "zstd")
+            threshold: Minimum encoded size in bytes before compression is applied
+
+        Raises:
+            ValueError: If the encoding or compression is unknown or unavailable
+        """
+        if encoding not in self.ENCODINGS:
+            raise ValueError(f"Unknown history encoding '{encoding}', expected one of {', '.join(self.ENCODINGS)}")
+        if compression not in self.COMPRESSIONS:
+            raise ValueError(f"Unknown history compression '{compression}', expected one of {', '.join(self.COMPRESSIONS)}")
+        if compression == "zstd" and zstandard is None:
+            raise ValueError("History compression 'zstd' requires the zstandard package")
+
+        self.encoding = encoding
+        self.compression = compression
+        self.threshold = threshold
+
+        # Reverse lookups used when reading tagged blobs
+        self._decoders = {code: decode for code, _, decode in self.ENCODINGS.values()}
+        self._decompressors = {code: decompress for code, _, decompress in self.COMPRESSIONS.values()}
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a serializer from the HISTORY_* application settings."""
+        return cls(
+            encoding=config["HISTORY_ENCODING"],
+            compression=config["HISTORY_COMPRESSION"],
+            threshold=config["HISTORY_COMPRESS_THRESHOLD"]
+        )
+
+    def dumps(self, history):
+        """Serialize a history into a tagged blob.
+
+        Args:
+            history: List of message dictionaries with role and content
+
+        Returns:
+            bytes: Tagged blob ready to be stored
+        """
+        encoding_code, encode, _ = self.ENCODINGS[self.encoding]
+        payload = encode(history)
+
+        compression = self.compression if len(payload) >= self.threshold else "none"
+        compression_code, compress, _ = self.COMPRESSIONS[compression]
+
+        return self.VERSION + encoding_code + compression_code + compress(payload)
+
+    def loads(self, blob):
+        """Deserialize a blob written by any version of the serializer.
+
+        Args:
+            blob: Stored bytes (or legacy JSON text)
+
+        Returns:
+            list: The history, or an empty list if blob is empty
+
+        Raises:
+            ValueError: If the blob has an unknown tag
+        """
+        if not blob:
+            return []
+
+        # Legacy untagged JSON
+        if isinstance(blob, str) or blob[:1] != self.VERSION:
+            return json.loads(blob)
+
+        encoding_code, compression_code, payload = blob[1:2], blob[2:3], blob[3:]
+        if encoding_code not in self._decoders or compression_code not in self._decompressors:
+            raise ValueError(f"Unknown history format tag {blob[:3]!r}")
+        if compression_code == self.COMPRESSIONS["zstd"][0] and zstandard is None:
+            raise ValueError("History is zstd-compressed but the zstandard package is not installed")
+
+        return self._decoders[encoding_code](self._decompressors[compression_code](payload))
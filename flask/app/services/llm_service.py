@@ -1,3 +1,7 @@
+import json
+import socket
+import threading
+import time
 import requests
 from flask import current_app as app
 from app.logs import log
@@ -5,15 +9,84 @@ from ddtrace import tracer
 import os
 
 
+class CannedResponse:
+    """Stand-in for a streaming Ollama response that replays a complete answer (e.g. a cache hit)."""
+
+    status_code = 200
+
+    def __init__(self, model, content):
+        self.model = model
+        self.content = content
+
+    def iter_lines(self):
+        """Yield the answer as Ollama NDJSON chunks: one content chunk, then the final chunk."""
+        yield json.dumps({"model": self.model, "message": {"role": "assistant", "content": self.content}, "done": False}).encode("utf-8")
+        yield json.dumps({"model": self.model, "message": {"role": "assistant", "content": ""}, "done": True}).encode("utf-8")
+
+    def close(self):
+        pass
+
+
+def abort_stream(response):
+    """Abort a streaming Ollama response from another thread, failing any read in progress.
+    
+    Closing a response from another thread doesn't wake up a read blocked on a stalled
+    stream, so the socket is shut down first: the blocked read then fails right away.
+    """
+    sock = getattr(getattr(getattr(response, "raw", None), "_connection", None), "sock", None)
+    if sock is not None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # already closed
+    response.close()
+
+
+class StreamDeadline:
+    """Aborts a streaming Ollama response once a wall-clock budget is spent (see abort_stream)."""
+
+    def __init__(self, response, seconds):
+        self.response = response
+        self.expired = threading.Event()
+        self._timer = threading.Timer(max(seconds, 0), self.abort)
+        self._timer.daemon = True
+        self._timer.start()
+
+    def abort(self):
+        """Abort the response now."""
+        self.expired.set()
+        abort_stream(self.response)
+
+    def cancel(self):
+        self._timer.cancel()
+
+
 class LLMService:
     """Service for interacting with the LLM."""
     
     OLLAMA_HOST = os.getenv('OLLAMA_HOST')
+    CONNECT_TIMEOUT = 5
+    _options = None
+    # OllamaRecorder capturing or replaying chat traffic, None to talk to Ollama directly
+    recorder = None
+
+    # Stats reported by Ollama on the final ("done") chunk of a generation
+    USAGE_FIELDS = (
+        "done_reason",
+        "total_duration",
+        "load_duration",
+        "prompt_eval_count",
+        "prompt_eval_duration",
+        "eval_count",
+        "eval_duration"
+    )
 
     @classmethod
     @tracer.wrap(service="ollama")
     def get_available_models(cls):
         """Get list of available models from Ollama."""
+        if cls.recorder and cls.recorder.mode == "replay":
+            return cls.recorder.models()
         try:
             response = requests.get(f"{cls.OLLAMA_HOST}/api/tags")
             if response.status_code != 200:
@@ -22,6 +95,33 @@ class LLMService:
         except Exception as e:
             raise ValueError(f"Failed to fetch available models: {str(e)}")
     
+    @classmethod
+    @tracer.wrap(service="ollama")
+    def embed(cls, model, text):
+        """Embed a text with an Ollama embedding model.
+        
+        Args:
+            model: Name of the Ollama embedding model (e.g. 'nomic-embed-text')
+            text: Text to embed
+            
+        Returns:
+            list: The embedding vector
+            
+        Raises:
+            ValueError: If Ollama fails to embed the text
+        """
+        try:
+            response = requests.post(
+                f"{cls.OLLAMA_HOST}/api/embed",
+                json={"model": model, "input": text},
+                timeout=(cls.CONNECT_TIMEOUT, 30)
+            )
+            if response.status_code != 200:
+                raise ValueError(f"Failed to embed text: {response.text}")
+            return response.json()["embeddings"][0]
+        except (requests.exceptions.RequestException, KeyError, IndexError) as e:
+            raise ValueError(f"Failed to embed text: {str(e)}")
+
     @classmethod
     @tracer.wrap(service="ollama")
     def check_ollama_status(cls):
@@ -38,6 +138,10 @@ class LLMService:
         if app.config['TEST_OLLAMA_NOMODEL']:
             log.warning("TEST MODE: Simulating no models available in Ollama")
             raise ValueError("**No models available**\n\nPlease install a model first. For example:\n\n`ollama pull mistral`")
+        
+        # Replayed traffic doesn't need a running Ollama
+        if cls.recorder and cls.recorder.mode == "replay":
+            return
             
         try:
             # First check if Ollama is running
@@ -55,6 +159,32 @@ class LLMService:
         except Exception as e:
             raise ValueError(f"**Error checking Ollama status**\n\n{str(e)}\n\nPlease check your Ollama installation.")
     
+    @classmethod
+    def options(cls):
+        """Get the Ollama inference options, built once per worker from the app config.
+        
+        Returns:
+            dict: Options for the Ollama chat API (shared, do not mutate)
+        """
+        if cls._options is None:
+            cls._options = {
+                "temperature": app.config["OLLAMA_TEMPERATURE"],
+                "top_p": app.config["OLLAMA_TOP_P"],
+                "num_predict": int(app.config.get("OLLAMA_NUM_PREDICT")),
+                "num_ctx": int(app.config.get("OLLAMA_NUM_CTX"))
+            }
+        return cls._options
+
+    def _post_chat(self, ollama_request, timeout=None):
+        """Send a streaming chat request to Ollama, through the recorder if one is set.
+        
+        Returns:
+            Streaming response (requests.Response or a response-like object with iter_lines())
+        """
+        if self.recorder:
+            return self.recorder.post(self.url, ollama_request, timeout=timeout)
+        return requests.post(self.url, json=ollama_request, stream=True, timeout=timeout)
+
     def __init__(self, model: str, prompt: str = None):
         """Initialize the LLM service and validate the model.
         
@@ -85,22 +215,13 @@ class LLMService:
                 "model": self.model,
                 "messages": messages,
                 "stream": True,
-                "options": {
-                    "temperature": app.config["OLLAMA_TEMPERATURE"],
-                    "top_p": app.config["OLLAMA_TOP_P"],
-                    "num_predict": int(app.config.get("OLLAMA_NUM_PREDICT")),
-                    "num_ctx": int(app.config.get("OLLAMA_NUM_CTX"))
-                }
+                "options": self.options()
             }
 
-            log.info(f"Making Ollama API call with model: {self.model}, using system prompt: {self.prompt}")
+            log.info("Making Ollama API call with model: %s, using system prompt: %.80s", self.model, self.prompt)
 
             # Forward the request to Ollama    
-            response = requests.post(
-                f"{self.OLLAMA_HOST}/api/chat",
-                json=ollama_request,
-                stream=True
-            )
+            response = self._post_chat(ollama_request)
             if response.status_code != 200:
                 raise ValueError(f"Failed to generate response: {response.text}")
             return response
@@ -108,39 +229,56 @@ class LLMService:
             raise ValueError(f"Failed to generate response: {str(e)}")
 
     @tracer.wrap(service="ollama")
-    def generate_response_sync(self, messages):
-        """Get a synchronous (non-streaming) response from Ollama.
+    def generate_response_sync(self, messages, max_tokens=None, max_latency=None):
+        """Get a complete response from Ollama, consuming its streaming protocol internally.
+        
+        The answer is assembled chunk by chunk rather than buffered whole, so a
+        deadline can stop a runaway generation and still return what was produced.
         
         Args:
             messages (list): List of message objects with role and content
+            max_tokens (int): Optional cap on generated chunks (~tokens) before truncating
+            max_latency (float): Optional wall-clock budget in seconds before truncating.
+                Defaults to OLLAMA_SYNC_MAX_LATENCY.
         
         Returns:
-            str: The model's response text
+            dict: {"content": str, "truncated": bool, "usage": dict}
+                - content: The model's response text (partial if truncated)
+                - truncated: True if a deadline cut the generation short
+                - usage: Stats from Ollama's final chunk (eval counts, durations), empty if truncated
         """
+        if max_latency is None:
+            max_latency = app.config["OLLAMA_SYNC_MAX_LATENCY"]
+
+        response = None
+        deadline = None
         try:
             # Prepare messages with system prompt if it exists
             if self.prompt:
                 messages = [{"role": "system", "content": self.prompt}] + messages
 
-            log.info(f"Making Ollama API call with model: {self.model}, using system prompt: {self.prompt}")
+            log.info("Making Ollama API call with model: %s, using system prompt: %.80s", self.model, self.prompt)
 
             # Prepare the request for Ollama
             ollama_request = {
                 "model": self.model,
                 "messages": messages,
-                "stream": False,
-                "options": {
-                    "temperature": app.config["OLLAMA_TEMPERATURE"],
-                    "top_p": app.config["OLLAMA_TOP_P"],
-                    "num_predict": int(app.config.get("OLLAMA_NUM_PREDICT")),
-                    "num_ctx": int(app.config.get("OLLAMA_NUM_CTX"))
-                }
+                "stream": True,
+                "options": self.options()
             }
 
-            response = requests.post(
-                f"{self.OLLAMA_HOST}/api/chat",
-                json=ollama_request
-            )
+            started = time.monotonic()
+            try:
+                response = self._post_chat(
+                    ollama_request,
+                    # Bounds the wait for Ollama's first bytes, the deadline below bounds the rest of the stream
+                    timeout=(self.CONNECT_TIMEOUT, max_latency) if max_latency else None
+                )
+            except requests.exceptions.ReadTimeout:
+                # Ollama sends no headers before its first token (model load, prompt eval):
+                # the budget was spent before anything was generated
+                log.warning("Truncated sync response from model %s before its first token", self.model)
+                return {"content": "", "truncated": True, "usage": {}}
             
             if response.status_code == 404:
                 # Model not found, get available models
@@ -151,13 +289,63 @@ class LLMService:
                     raise ValueError(f"Model '{self.model}' not found and {str(e)}")
             
             response.raise_for_status()
-            
-            data = response.json()
-            if "message" in data and "content" in data["message"]:
-                return data["message"]["content"]
-            else:
-                raise ValueError("Unexpected response format from Ollama")
+
+            # Per-read timeouts restart on every chunk, so the wall-clock budget is enforced by a timer
+            if max_latency:
+                deadline = StreamDeadline(response, max_latency - (time.monotonic() - started))
+
+            chunks = []
+            usage = {}
+            truncated = False
+            try:
+                for line in response.iter_lines():
+                    if not line:
+                        continue
+                    chunk = json.loads(line)
+
+                    # Ollama reports mid-stream failures as an error chunk
+                    if "error" in chunk:
+                        raise ValueError(f"Failed to generate response: {chunk['error']}")
+
+                    content = chunk.get("message", {}).get("content")
+                    if content:
+                        chunks.append(content)
+
+                    if chunk.get("done"):
+                        usage = {key: chunk[key] for key in self.USAGE_FIELDS if key in chunk}
+                        break
+
+                    if max_tokens and len(chunks) >= max_tokens:
+                        truncated = True
+                        break
+                else:
+                    if not (deadline and deadline.expired.is_set()):
+                        raise ValueError("Unexpected response format from Ollama: stream ended without a final chunk")
+                    truncated = True
+            except Exception:
+                # Reads fail once the deadline aborts the stream, that's a truncation, not an error
+                if not (deadline and deadline.expired.is_set()):
+                    raise
+                truncated = True
+
+            if truncated:
+                log.warning("Truncated sync response from model %s after %d chunks", self.model, len(chunks))
+
+            return {
+                "content": "".join(chunks),
+                "truncated": truncated,
+                "usage": usage
+            }
                 
+        except requests.exceptions.ConnectTimeout as e:
+            log.error(f"Timed out connecting to the LLM: {str(e)}")
+            raise ValueError(f"Timed out connecting to Ollama after {self.CONNECT_TIMEOUT}s")
         except Exception as e:
             log.error(f"Error getting sync response from LLM: {str(e)}")
-            raise 
\ No newline at end of file
+            raise
+        finally:
+            if deadline:
+                deadline.cancel()
+            # Closing the connection also tells Ollama to stop generating
+            if response is not None:
+                response.close()
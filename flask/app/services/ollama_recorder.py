@@ -0,0 +1,216 @@
+import gzip
+import hashlib
+import itertools
+import json
+import os
+import threading
+import time
+import requests
+from app.logs import log
+
+
+class RecordingResponse:
+    """Wraps a streaming Ollama response, recording its chunks and inter-chunk timings as they are read."""
+
+    def __init__(self, response, path, ollama_request, started):
+        """Initialize the recording.
+
+        Args:
+            response: Streaming requests.Response from Ollama
+            path: Recording file
+            ollama_request: Request payload, saved in the recording header
+            started: time.monotonic() when the request was sent, so the first
+                recorded delay includes Ollama's time to first token
+        """
+        self.response = response
+        self.path = path
+        self.ollama_request = ollama_request
+        self.started = started
+        self.status_code = response.status_code
+
+    @property
+    def text(self):
+        return self.response.text
+
+    @property
+    def raw(self):
+        return self.response.raw
+
+    def raise_for_status(self):
+        self.response.raise_for_status()
+
+    def iter_lines(self):
+        """Yield the response lines, saving the recording when Ollama's final chunk arrives.
+
+        The recording is saved before the final chunk is handed over, as consumers
+        usually stop reading right after it. Incomplete streams are not saved.
+        """
+        chunks = []
+        last = self.started
+        for line in self.response.iter_lines():
+            now = time.monotonic()
+            if line:
+                chunks.append([round(now - last, 6), line.decode("utf-8")])
+                last = now
+                if b'"done"' in line and self._is_done(line):
+                    self._save(chunks)
+            yield line
+
+    @staticmethod
+    def _is_done(line):
+        try:
+            return bool(json.loads(line).get("done"))
+        except ValueError:
+            return False
+
+    def _save(self, chunks):
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        with gzip.open(f"{self.path}.tmp", "wt", encoding="utf-8") as f:
+            f.write(json.dumps({"version": 1, "request": self.ollama_request, "recorded_at": time.time()}) + "\n")
+            for chunk in chunks:
+                f.write(json.dumps(chunk) + "\n")
+        os.replace(f"{self.path}.tmp", self.path)
+        log.info("Recorded %d Ollama chunks to %s", len(chunks), self.path)
+
+    def close(self):
+        self.response.close()
+
+
+class ReplayResponse:
+    """Stand-in for a streaming Ollama response, serving a recording at a chosen pace."""
+
+    status_code = 200
+    text = ""
+
+    def __init__(self, path, speed=1.0):
+        """Initialize the replay.
+
+        Args:
+            path: Recording file
+            speed: Pace multiplier, 1 replays original timings, 10 ten times faster, 0 without delays
+        """
+        self.path = path
+        self.speed = speed
+        self._closed = threading.Event()
+
+    def raise_for_status(self):
+        pass
+
+    def iter_lines(self):
+        """Yield the recorded NDJSON lines, sleeping the recorded delay (scaled by speed) before each.
+
+        Like a live stream, the replay stops as soon as the response is closed, even mid-delay.
+        """
+        with gzip.open(self.path, "rt", encoding="utf-8") as f:
+            next(f)  # header
+            for entry in f:
+                delay, line = json.loads(entry)
+                if self.speed and delay:
+                    self._closed.wait(delay / self.speed)
+                if self._closed.is_set():
+                    return
+                yield line.encode("utf-8")
+
+    def close(self):
+        self._closed.set()
+
+
+class OllamaRecorder:
+    """Record or replay Ollama /api/chat traffic, for deterministic offline benchmarks.
+
+    Recordings are gzipped NDJSON files named after a hash of the request payload (model,
+    messages, options): a header line with the request, then one [delay, chunk] line per chunk.
+    """
+
+    MODES = ("record", "replay")
+
+    def __init__(self, mode, directory, speed=1.0, match="exact"):
+        """Initialize the recorder.
+
+        Args:
+            mode: "record" to capture live traffic, "replay" to serve recordings instead of Ollama
+            directory: Where recordings are stored
+            speed: Replay pace multiplier (0 for no delays)
+            match: "exact" replays the recording of the same request only,
+                "any" falls back to cycling through all recordings in a fixed order
+
+        Raises:
+            ValueError: If the mode or match is unknown
+        """
+        if mode not in self.MODES:
+            raise ValueError(f"Unknown Ollama mode '{mode}', expected live, {' or '.join(self.MODES)}")
+        if match not in ("exact", "any"):
+            raise ValueError(f"Unknown replay match '{match}', expected exact or any")
+        self.mode = mode
+        self.directory = directory
+        self.speed = speed
+        self.match = match
+        self._fallback = itertools.count()
+
+    @classmethod
+    def from_config(cls, config):
+        """Build a recorder from the OLLAMA_* application settings, None in live mode."""
+        if config["OLLAMA_MODE"] == "live":
+            return None
+        return cls(
+            mode=config["OLLAMA_MODE"],
+            directory=config["OLLAMA_RECORDINGS_DIR"],
+            speed=config["OLLAMA_REPLAY_SPEED"],
+            match=config["OLLAMA_REPLAY_MATCH"]
+        )
+
+    @staticmethod
+    def request_key(ollama_request):
+        """Stable key of a chat request, ignoring transport-only fields."""
+        payload = {key: ollama_request.get(key) for key in ("model", "messages", "options")}
+        return hashlib.sha1(json.dumps(payload, sort_keys=True).encode("utf-8")).hexdigest()
+
+    def path(self, ollama_request):
+        return os.path.join(self.directory, f"{self.request_key(ollama_request)}.ndjson.gz")
+
+    def recordings(self):
+        """List the recording files, in a stable order."""
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(os.path.join(self.directory, name) for name in os.listdir(self.directory)
+                      if name.endswith(".ndjson.gz"))
+
+    @staticmethod
+    def read_request(path):
+        """Read the request a recording was captured for."""
+        with gzip.open(path, "rt", encoding="utf-8") as f:
+            return json.loads(next(f))["request"]
+
+    def models(self):
+        """Models found in the recordings, standing in for Ollama's model list in replay mode."""
+        return sorted({self.read_request(path)["model"] for path in self.recordings()})
+
+    def post(self, url, ollama_request, timeout=None):
+        """Send a chat request through the recorder.
+
+        Args:
+            url: Ollama chat endpoint
+            ollama_request: Request payload
+            timeout: requests timeout, live traffic only
+
+        Returns:
+            RecordingResponse or ReplayResponse: Response-like object with iter_lines()
+
+        Raises:
+            ValueError: In replay mode, if no recording matches the request
+        """
+        if self.mode == "record":
+            # Taken before sending: the POST only returns once Ollama sends its first chunk
+            started = time.monotonic()
+            response = requests.post(url, json=ollama_request, stream=True, timeout=timeout)
+            if response.status_code != 200:
+                return response
+            return RecordingResponse(response, self.path(ollama_request), ollama_request, started)
+
+        path = self.path(ollama_request)
+        if not os.path.exists(path):
+            recordings = self.recordings()
+            if self.match != "any" or not recordings:
+                raise ValueError(f"No Ollama recording for this request ({self.request_key(ollama_request)})")
+            path = recordings[next(self._fallback) % len(recordings)]
+        return ReplayResponse(path, speed=self.speed)
@@ -0,0 +1,137 @@
+import heapq
+from flask import current_app as app
+from app.logs import log
+from ddtrace import tracer
+
+
+class RetentionService:
+    """Service for keeping per-user chat state in Redis within a memory budget."""
+
+    HISTORY_PREFIX = "chat_history:"
+    CONFIG_PREFIX = "chat_config:"
+
+    # Keys fetched per SCAN call and per pipeline round trip
+    BATCH_SIZE = 500
+
+    @classmethod
+    def _scan_batches(cls, prefix):
+        """Iterate over all keys with the given prefix, in pipeline-sized batches.
+
+        Args:
+            prefix: Key prefix to match
+
+        Yields:
+            list: Batch of at most BATCH_SIZE keys
+        """
+        batch = []
+        for key in app.redis_client.scan_iter(match=f"{prefix}*", count=cls.BATCH_SIZE):
+            batch.append(key)
+            if len(batch) >= cls.BATCH_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    @classmethod
+    @tracer.wrap(name="retention.sweep")
+    def sweep(cls, dry_run=False):
+        """Bring chat keys written before retention existed under the retention policy.
+
+        - Applies CHAT_TTL to chat keys that have no expiry
+        - Deletes histories whose config is gone (they can no longer be loaded)
+
+        Args:
+            dry_run: Only count what would change, without writing
+
+        Returns:
+            dict: Counts of scanned, expired and deleted keys
+        """
+        ttl = app.config["CHAT_TTL"]
+        stats = {"scanned": 0, "expired": 0, "deleted": 0}
+
+        for prefix in (cls.HISTORY_PREFIX, cls.CONFIG_PREFIX):
+            for batch in cls._scan_batches(prefix):
+                stats["scanned"] += len(batch)
+
+                pipe = app.redis_client.pipeline(transaction=False)
+                for key in batch:
+                    pipe.ttl(key)
+                if prefix == cls.HISTORY_PREFIX:
+                    for key in batch:
+                        pipe.exists(cls.CONFIG_PREFIX + key[len(cls.HISTORY_PREFIX):])
+                results = pipe.execute()
+                ttls = results[:len(batch)]
+                has_config = results[len(batch):] or [True] * len(batch)
+
+                orphans = [key for key, found in zip(batch, has_config) if not found]
+                persistent = [key for key, key_ttl, found in zip(batch, ttls, has_config)
+                              if key_ttl == -1 and found]
+                if not ttl:
+                    persistent = []
+
+                stats["deleted"] += len(orphans)
+                stats["expired"] += len(persistent)
+                if dry_run or not (orphans or persistent):
+                    continue
+
+                pipe = app.redis_client.pipeline(transaction=False)
+                if orphans:
+                    pipe.delete(*orphans)
+                for key in persistent:
+                    pipe.expire(key, ttl)
+                pipe.execute()
+
+        log.info(f"Retention sweep {'(dry run) ' if dry_run else ''}done: {stats}")
+        return stats
+
+    @classmethod
+    @tracer.wrap(name="retention.report")
+    def report(cls, top=10):
+        """Report memory used by per-user chat state.
+
+        Args:
+            top: Number of largest conversations to list
+
+        Returns:
+            dict: {
+                "keys": total chat keys,
+                "bytes": total bytes used by chat keys,
+                "persistent": keys without expiry,
+                "by_prefix": {prefix: {"keys": int, "bytes": int}},
+                "largest": [(history key, bytes, ttl), ...] largest first
+            }
+        """
+        report = {"keys": 0, "bytes": 0, "persistent": 0, "by_prefix": {}, "largest": []}
+        largest = []
+
+        for prefix in (cls.HISTORY_PREFIX, cls.CONFIG_PREFIX):
+            prefix_stats = {"keys": 0, "bytes": 0}
+
+            for batch in cls._scan_batches(prefix):
+                pipe = app.redis_client.pipeline(transaction=False)
+                for key in batch:
+                    pipe.memory_usage(key)
+                    pipe.ttl(key)
+                results = pipe.execute()
+
+                for key, size, key_ttl in zip(batch, results[::2], results[1::2]):
+                    # Key may have expired between SCAN and MEMORY USAGE
+                    if size is None:
+                        continue
+                    prefix_stats["keys"] += 1
+                    prefix_stats["bytes"] += size
+                    if key_ttl == -1:
+                        report["persistent"] += 1
+                    if prefix == cls.HISTORY_PREFIX:
+                        entry = (size, key, key_ttl)
+                        if len(largest) < top:
+                            heapq.heappush(largest, entry)
+                        elif top:
+                            heapq.heappushpop(largest, entry)
+
+            report["by_prefix"][prefix] = prefix_stats
+            report["keys"] += prefix_stats["keys"]
+            report["bytes"] += prefix_stats["bytes"]
+
+        report["largest"] = [(key, size, key_ttl) for size, key, key_ttl in sorted(largest, reverse=True)]
+        return report
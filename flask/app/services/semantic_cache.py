@@ -0,0 +1,168 @@
+import collections
+import hashlib
+import re
+import threading
+import time
+import numpy as np
+from ddtrace import tracer
+from app.logs import log
+
+
+def stub_embedding(text, dims=256):
+    """Deterministic offline embedding: hashed bag of words and word bigrams.
+
+    Paraphrases sharing most of their words land close to each other, which is enough
+    to exercise the cache without an embedding model.
+    """
+    vector = np.zeros(dims, dtype=np.float32)
+    words = text.split()
+    for token in words + [f"{a} {b}" for a, b in zip(words, words[1:])]:
+        digest = hashlib.blake2b(token.encode("utf-8"), digest_size=8).digest()
+        vector[int.from_bytes(digest[:4], "little") % dims] += 1.0 if digest[4] & 1 else -1.0
+    return vector
+
+
+class SemanticCache:
+    """In-process response cache keyed by prompt embedding similarity.
+
+    Entries are partitioned by namespace (model + system prompt), so an answer is only
+    reused for the same model and instructions. Within a namespace, vectors are kept
+    L2-normalized in a matrix, so cosine similarity against every entry is one matrix product.
+    Entries expire after ttl seconds, and the least recently used are evicted past max_entries.
+    """
+
+    def __init__(self, embed, threshold=0.95, max_entries=1000, ttl=3600):
+        """Initialize the cache.
+
+        Args:
+            embed: Callable turning a normalized prompt into a vector
+            threshold: Minimum cosine similarity for a hit
+            max_entries: Maximum entries across all namespaces
+            ttl: Seconds an entry stays valid, 0 for no expiry
+        """
+        self.embed_fn = embed
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.lookups = 0
+        self.hits = 0
+        self._lock = threading.Lock()
+        self._indexes = {}  # namespace -> {"vectors": np.ndarray, "answers": [(id, str)], "created": [float]}
+        self._lru = collections.OrderedDict()  # (namespace, answer id) -> None, least recently used first
+        self._next_id = 0
+
+    @staticmethod
+    def namespace(model, system_prompt):
+        """Cache partition for a model and system prompt."""
+        return hashlib.sha1(f"{model}\0{system_prompt or ''}".encode("utf-8")).hexdigest()
+
+    @staticmethod
+    def normalize(prompt):
+        """Normalize a prompt before embedding (case, punctuation, whitespace)."""
+        return re.sub(r"\s+", " ", re.sub(r"[^\w\s]", " ", prompt)).strip().lower()
+
+    @tracer.wrap(name="semantic_cache.embed")
+    def embed(self, prompt):
+        """Embed a prompt as an L2-normalized vector.
+
+        Returns:
+            np.ndarray: Unit vector, or None if the prompt could not be embedded
+        """
+        try:
+            vector = np.asarray(self.embed_fn(self.normalize(prompt)), dtype=np.float32)
+        except Exception as e:
+            log.warning(f"Semantic cache bypassed, embedding failed: {str(e)}")
+            return None
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else None
+
+    @tracer.wrap(name="semantic_cache.lookup")
+    def lookup(self, namespace, vector):
+        """Find the cached answer closest to vector.
+
+        Args:
+            namespace: Cache partition, see namespace()
+            vector: Unit vector returned by embed()
+
+        Returns:
+            tuple: (answer or None, best similarity or None)
+        """
+        answer, similarity = None, None
+        with self._lock:
+            self.lookups += 1
+            self._expire()
+            index = self._indexes.get(namespace)
+            if index is not None and vector is not None and len(index["answers"]):
+                similarities = index["vectors"] @ vector
+                best = int(np.argmax(similarities))
+                similarity = float(similarities[best])
+                if similarity >= self.threshold:
+                    answer_id, answer = index["answers"][best]
+                    self._lru.move_to_end((namespace, answer_id))
+                    self.hits += 1
+
+        span = tracer.current_span()
+        if span:
+            span.set_tag("semantic_cache.hit", answer is not None)
+            span.set_tag("semantic_cache.hit_rate", self.hits / self.lookups)
+            if similarity is not None:
+                span.set_tag("semantic_cache.similarity", similarity)
+        return answer, similarity
+
+    @tracer.wrap(name="semantic_cache.store")
+    def store(self, namespace, vector, answer):
+        """Cache an answer for the prompt embedded as vector.
+
+        Args:
+            namespace: Cache partition, see namespace()
+            vector: Unit vector returned by embed()
+            answer: Complete model answer
+        """
+        if vector is None or not answer:
+            return
+        with self._lock:
+            index = self._indexes.get(namespace)
+            if index is not None and index["vectors"].shape[1] != vector.shape[0]:
+                # Embedding dimensions changed (e.g. new embedding model), start the namespace over
+                self._remove(namespace, lambda position, entry: True)
+                index = None
+            if index is None:
+                index = {"vectors": np.empty((0, vector.shape[0]), dtype=np.float32), "answers": [], "created": []}
+                self._indexes[namespace] = index
+
+            answer_id = self._next_id
+            self._next_id += 1
+            index["vectors"] = np.vstack([index["vectors"], vector])
+            index["answers"].append((answer_id, answer))
+            index["created"].append(time.monotonic())
+            self._lru[(namespace, answer_id)] = None
+
+            while len(self._lru) > self.max_entries:
+                (evicted_namespace, evicted_id), _ = self._lru.popitem(last=False)
+                self._remove(evicted_namespace, lambda position, entry: entry[0] == evicted_id)
+
+    def _expire(self):
+        """Drop entries older than ttl. Caller holds the lock."""
+        if not self.ttl:
+            return
+        cutoff = time.monotonic() - self.ttl
+        for namespace in list(self._indexes):
+            index = self._indexes[namespace]
+            if index["created"][0] < cutoff:
+                self._remove(namespace, lambda position, entry: index["created"][position] < cutoff)
+
+    def _remove(self, namespace, predicate):
+        """Remove the entries of a namespace matching predicate(position, (id, answer)). Caller holds the lock."""
+        index = self._indexes[namespace]
+        keep = []
+        for position, entry in enumerate(index["answers"]):
+            if predicate(position, entry):
+                self._lru.pop((namespace, entry[0]), None)
+            else:
+                keep.append(position)
+        if not keep:
+            del self._indexes[namespace]
+            return
+        index["vectors"] = index["vectors"][keep]
+        index["answers"] = [index["answers"][position] for position in keep]
+        index["created"] = [index["created"][position] for position in keep]
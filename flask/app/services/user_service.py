@@ -15,6 +15,15 @@ class User:
         """Generate a random user ID."""
         return ''.join(random.choice('1234567890abcdef') for _ in range(8))
 
+    @staticmethod
+    def requested_id():
+        """Get the user ID the current request is made as: URL param first, then session cookie.
+        
+        Returns:
+            str: User ID, or None for a new visitor
+        """
+        return flask.request.args.get("user_id") or flask.session.get("user_id")
+
     @classmethod
     def from_session(cls):
         """Create a User instance from the current session."""
@@ -25,4 +34,4 @@ class User:
         """Log in the user by setting session data."""
         flask.session["user_id"] = self.user_id
         flask.session["user_email"] = self.email
-        log.info(f"user {self.user_id} logged in") 
\ No newline at end of file
+        log.info("user %s logged in", self.user_id) 
\ No newline at end of file
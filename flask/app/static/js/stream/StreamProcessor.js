@@ -73,6 +73,10 @@ class StreamProcessor {
                 if (parsed.content) {
                     this.tokenBuffer.append(parsed.content);
                     this.dataBuffer = '';  // Reset buffer after successful parse
+                } else if (parsed.interrupted) {
+                    // Server restarted mid-answer, the partial answer was kept
+                    this.tokenBuffer.append('\n\n[Answer interrupted by a server restart, please resend your message]');
+                    this.dataBuffer = '';
                 }
             } catch (e) {
                 // Ignore expected JSON parsing errors for incomplete chunks
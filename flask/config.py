@@ -18,6 +18,31 @@ class Config:
     # REDIS ###############
     REDIS_HOST = os.environ.get("REDIS_HOST")
 
+    # CHAT RETENTION ###############
+    # Validate the sliding TTL (seconds) on per-user chat state, refreshed on every access. 0 disables expiry.
+    CHAT_TTL = validate_int_in_range(
+        os.environ.get("CHAT_TTL", 7 * 24 * 3600),  # default to 7 days
+        min_val=0,
+        max_val=365 * 24 * 3600,
+        name="CHAT_TTL"
+    )
+
+    # Max user configs cached per worker (invalidated through Redis keyspace notifications)
+    CONFIG_CACHE_MAX_ENTRIES = int(os.environ.get("CONFIG_CACHE_MAX_ENTRIES", 10000))
+
+    # Stored history format (see app/services/history_serializer.py). Older formats stay readable.
+    HISTORY_ENCODING = os.environ.get("HISTORY_ENCODING", "msgpack")  # json | msgpack
+    HISTORY_COMPRESSION = os.environ.get("HISTORY_COMPRESSION", "zlib")  # none | zlib | zstd
+    HISTORY_COMPRESS_THRESHOLD = int(os.environ.get("HISTORY_COMPRESS_THRESHOLD", 1024))  # bytes
+
+    # Validate max messages kept per conversation (oldest are dropped first)
+    CHAT_MAX_MESSAGES = validate_int_in_range(
+        os.environ.get("CHAT_MAX_MESSAGES", 200),
+        min_val=2,
+        max_val=10000,
+        name="CHAT_MAX_MESSAGES"
+    )
+
     # OLLAMA ###############
     OLLAMA_TEMPERATURE = float(os.environ.get("OLLAMA_TEMPERATURE", "0.8"))  # default to 0.8
     OLLAMA_TOP_P = float(os.environ.get("OLLAMA_TOP_P", "0.9"))  # default to 0.9
@@ -39,6 +64,39 @@ class Config:
     )
     
     OLLAMA_HOST = os.environ.get("OLLAMA_HOST")
+    # Ollama traffic mode: live, record (capture chat streams to OLLAMA_RECORDINGS_DIR) or replay (serve them offline)
+    OLLAMA_MODE = os.environ.get("OLLAMA_MODE", "live").lower()
+    OLLAMA_RECORDINGS_DIR = os.environ.get("OLLAMA_RECORDINGS_DIR", "/flask/recordings")
+    OLLAMA_REPLAY_SPEED = float(os.environ.get("OLLAMA_REPLAY_SPEED", "1"))  # 1 original pace, 0 no delays
+    OLLAMA_REPLAY_MATCH = os.environ.get("OLLAMA_REPLAY_MATCH", "exact")  # exact | any
+
+    DEFAULT_PROMPT_PATH = os.environ.get("DEFAULT_PROMPT_PATH", "/flask/default_prompt.txt")
+
+    # Wall-clock budget (seconds) for /api/chat generations, kept below the gunicorn worker timeout.
+    # A generation still running at the deadline is cut and returned as truncated. 0 disables it.
+    OLLAMA_SYNC_MAX_LATENCY = float(os.environ.get("OLLAMA_SYNC_MAX_LATENCY", "50"))
+
+    # SEMANTIC CACHE ###############
+    # Opt-in reuse of answers to near-duplicate single-turn prompts (/api/chat and first /ui/chat turn)
+    SEMANTIC_CACHE_ENABLED = os.environ.get("SEMANTIC_CACHE_ENABLED", "false").lower() in ("true", "1", "yes")
+    # Ollama embedding model, or "stub" for an offline hashed bag-of-words embedding
+    SEMANTIC_CACHE_EMBED_MODEL = os.environ.get("SEMANTIC_CACHE_EMBED_MODEL", "nomic-embed-text")
+    SEMANTIC_CACHE_THRESHOLD = float(os.environ.get("SEMANTIC_CACHE_THRESHOLD", "0.95"))  # min cosine similarity
+    SEMANTIC_CACHE_MAX_ENTRIES = int(os.environ.get("SEMANTIC_CACHE_MAX_ENTRIES", 1000))  # per worker
+    SEMANTIC_CACHE_TTL = int(os.environ.get("SEMANTIC_CACHE_TTL", 3600))  # seconds, 0 for no expiry
+
+    # PROFILER ###############
+    # Shared secret for the /api/profiler endpoints and the X-Profile header. Profiling is disabled when unset.
+    PROFILER_TOKEN = os.environ.get("PROFILER_TOKEN")
+    PROFILER_DIR = os.environ.get("PROFILER_DIR", "/flask/profiles")  # collapsed stacks, one file per worker
+    PROFILER_INTERVAL_MS = float(os.environ.get("PROFILER_INTERVAL_MS", "5"))  # default to 5ms between samples
+    PROFILER_REFRESH = float(os.environ.get("PROFILER_REFRESH", "5"))  # seconds between settings reloads from Redis
+    PROFILER_DUMP_INTERVAL = float(os.environ.get("PROFILER_DUMP_INTERVAL", "10"))  # seconds between dumps while profiling
+
+    # GRACEFUL DRAIN ###############
+    # Seconds in-flight chat streams get to finish when a worker stops (reload, scale-down, deploy).
+    # Streams still running are then cut, with their partial answer persisted.
+    DRAIN_GRACE_SECONDS = float(os.environ.get("DRAIN_GRACE_SECONDS", "25"))
 
     # TEST VARIABLES ###############
     TEST_OLLAMA_DOWN = os.environ.get("TEST_OLLAMA_DOWN", "false").lower() in ("true", "1", "yes")
@@ -0,0 +1,29 @@
+# Gunicorn settings, picked up from the working directory (/flask) on top of the command line in compose.yml
+import os
+import signal
+
+# Leave in-flight chat streams DRAIN_GRACE_SECONDS to finish (see app/drain.py and config.py),
+# gunicorn kills the worker a bit later if a stream is still stuck on Ollama.
+# Read from the environment, the app directory isn't importable yet when this file loads.
+graceful_timeout = float(os.environ.get("DRAIN_GRACE_SECONDS", "25")) + 5
+
+
+def post_worker_init(worker):
+    """Start draining chat streams when the worker is asked to stop (SIGTERM on reload, scale-down, deploy)."""
+    from app.drain import drain
+
+    drain.watch()
+    stop = signal.getsignal(signal.SIGTERM)
+
+    def on_sigterm(signum, frame):
+        drain.begin()
+        stop(signum, frame)
+
+    signal.signal(signal.SIGTERM, on_sigterm)
+
+
+def worker_exit(server, worker):
+    """Report drained versus cut streams before the worker exits."""
+    from app.drain import drain
+
+    drain.report()